@@ -1,5 +1,5 @@
 import os
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
 from scipy.io import loadmat
 import cv2 as cv
 import numpy as np
@@ -18,13 +18,15 @@ def get_perspective_projection_matrices(input_directory: str) -> np.ndarray:
     Returns
     -------
     ndarray
-        The perspective projection matrices.
+        The perspective projection matrices of shape
+        (number of matrices, 3, 4) in single precision.
     """
     # Load the camera calibration matrix data.
     data = loadmat(os.path.join(input_directory, 'dino_Ps.mat'))
-    return data['P'][0]
+    # Stack the matrices in a contiguous array.
+    return np.stack([ppm.astype(np.float32) for ppm in data['P'][0]])
 
-def get_images(images_directory: str) -> List[np.ndarray]:
+def get_images(images_directory: str) -> np.ndarray:
     """Get the images of the dinosaur from the images directory.
 
     Parameters
@@ -34,14 +36,30 @@ def get_images(images_directory: str) -> List[np.ndarray]:
 
     Returns
     -------
-    list of ndarray
-        A list containing the images of the dinosaur as numpy arrays.
+    ndarray
+        A contiguous array of shape
+        (number of images, image height, image width, 3) containing the
+        images of the dinosaur.
     """
-    # Load the images of the dinosaur.
-    images = []
+    # Sort the file names to load the images in the same order as their
+    # perspective projection matrices.
+    file_paths = [os.path.join(images_directory, file_name)
+                  for file_name in sorted(os.listdir(images_directory))]
+    if not len(file_paths):
+        return np.empty((0, 0, 0, 3), dtype=np.uint8)
+
+    # Load the first image to allocate a single array for all the images.
+    first_image = cv.imread(file_paths[0])
+    images = np.empty((len(file_paths),) + first_image.shape,
+                      dtype=first_image.dtype)
+    images[0] = first_image
+
+    def _load_image(index: int) -> None:
+        images[index] = cv.imread(file_paths[index])
 
-    for file_name in os.listdir(images_directory):
-        image = cv.imread(os.path.join(images_directory, file_name))
-        images.append(image)
+    # Load the rest of the images of the dinosaur in parallel, since OpenCV
+    # releases the GIL while decoding them.
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(_load_image, range(1, len(file_paths))))
 
     return images
@@ -1,5 +1,6 @@
 import os
 import vtk
+from vtk.util import numpy_support
 import numpy as np
 
 def save_voxels_with_occupancy(
@@ -20,10 +21,13 @@ def save_voxels_with_occupancy(
     """
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
-    with open(file_path, 'w') as f:
-        f.write("x, y, z, occ\n")
-        for occ, p in zip(occupancy, voxel_points.T[:, :-1]):
-            f.write(", ".join(p.astype(str)) + ", " + str(occ) + "\n")
+    # Stack the world coordinates of the points with their occupancy to get
+    # an array of shape (number of voxel points, 4).
+    data = np.column_stack((voxel_points[:-1].T, occupancy))
+
+    with open(file_path, 'w', buffering=1024*1024) as f:
+        np.savetxt(f, data, fmt=['%s', '%s', '%s', '%d'], delimiter=', ',
+                   header='x, y, z, occ', comments='')
 
 def save_voxels_as_rectilinear_grid(
     file_path: str,
@@ -54,21 +58,15 @@ def save_voxels_as_rectilinear_grid(
     z = voxel_points[1, ::mesh_grid_size*mesh_grid_size]
     x = voxel_points[2, :mesh_grid_size]
 
-    x_coords = vtk.vtkFloatArray()
-    for i in x:
-        x_coords.InsertNextValue(i)
-
-    y_coords = vtk.vtkFloatArray()
-    for i in y:
-        y_coords.InsertNextValue(i)
-
-    z_coords = vtk.vtkFloatArray()
-    for i in z:
-        z_coords.InsertNextValue(i)
-
-    values = vtk.vtkFloatArray()
-    for i in occupancy:
-        values.InsertNextValue(i)
+    # Wrap the coordinates and the occupancy values as VTK float arrays.
+    x_coords = numpy_support.numpy_to_vtk(
+        np.ascontiguousarray(x, dtype=np.float32), deep=1)
+    y_coords = numpy_support.numpy_to_vtk(
+        np.ascontiguousarray(y, dtype=np.float32), deep=1)
+    z_coords = numpy_support.numpy_to_vtk(
+        np.ascontiguousarray(z, dtype=np.float32), deep=1)
+    values = numpy_support.numpy_to_vtk(
+        np.ascontiguousarray(occupancy, dtype=np.float32), deep=1)
 
     rgrid = vtk.vtkRectilinearGrid()
     rgrid.SetDimensions(len(x), len(y), len(z))
@@ -1,20 +1,83 @@
-from typing import List, Tuple
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple, Union
 import cv2 as cv
 import numpy as np
 
+# Thread pool shared by the processing functions. The images are processed
+# in parallel, since OpenCV releases the GIL while processing them.
+_POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+def _map_images(
+    function: Callable[..., np.ndarray],
+    images: Union[List[np.ndarray], np.ndarray],
+    *other_images: Union[List[np.ndarray], np.ndarray]
+    ) -> Union[List[np.ndarray], np.ndarray]:
+    """
+    Apply a function to each image in parallel.
+
+    If `images` is an array, the results are written in a single array
+    allocated once, passing each slot of it to the function as the `dst`
+    argument of the underlying OpenCV call.
+
+    Parameters
+    ----------
+    function : (ndarray, ..., dst=None) -> ndarray
+        The function to apply to each image, optionally writing its result
+        in the given `dst` array.
+    images : list of ndarray or ndarray
+        The images to apply the function to.
+    *other_images : list of ndarray or ndarray
+        Further images passed along with each image to the function.
+
+    Returns
+    -------
+    list of ndarray or ndarray
+        The results of the function, stored in a single array if `images`
+        is an array. An empty list is returned if there are no images.
+    """
+    if not isinstance(images, np.ndarray):
+        return list(_POOL.map(function, images, *other_images))
+
+    n_images = min([len(images)] + [len(other) for other in other_images])
+    # The shape of the results is unknown without any image to apply the
+    # function to.
+    if not n_images:
+        return []
+    # Apply the function to the first image to get the shape of the results
+    # and allocate the array storing them all. The array is zeroed, since
+    # masked OpenCV operations leave the pixels outside the mask unchanged.
+    first_result = function(
+        images[0], *(other[0] for other in other_images))
+    results = np.zeros(
+        (n_images,) + first_result.shape, dtype=first_result.dtype)
+    results[0] = first_result
+
+    def _apply_function(index: int) -> None:
+        dst = results[index]
+        result = function(
+            images[index], *(other[index] for other in other_images),
+            dst=dst)
+        # OpenCV allocates a new array if the result does not fit in `dst`.
+        if not np.shares_memory(result, dst):
+            dst[...] = result
+
+    list(_POOL.map(_apply_function, range(1, n_images)))
+    return results
+
 def get_cropped_images(
-    images: List[np.ndarray],
+    images: Union[List[np.ndarray], np.ndarray],
     top: int = 5,
     bottom: int = 0,
     left: int = 0,
     right: int = 30
-    ) -> List[np.ndarray]:
+    ) -> Union[List[np.ndarray], np.ndarray]:
     """
     Crop the images to remove the black borders.
 
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to crop.
     top : int, optional
         The number of pixels to remove from the top, by default 5.
@@ -27,32 +90,37 @@ def get_cropped_images(
 
     Returns
     -------
-    list of ndarray
+    list of ndarray or ndarray
         The cropped images.
     """
     if not len(images):
         return images
     # Get the image dimensions.
     image_height, image_width, _ = images[0].shape
-    # Crop images black borders.
-    return [
-        img[top:image_height-bottom, left:image_width-right]
-        for img in images]
+    # Crop images black borders. Copy the crops to contiguous arrays to
+    # avoid OpenCV copying them internally at each subsequent call.
+    if isinstance(images, np.ndarray):
+        return np.ascontiguousarray(
+            images[:, top:image_height-bottom, left:image_width-right])
+    return _map_images(
+        lambda img: np.ascontiguousarray(
+            img[top:image_height-bottom, left:image_width-right]),
+        images)
 
 def get_images_to_original_dimensions(
-    images: List[np.ndarray],
+    images: Union[List[np.ndarray], np.ndarray],
     top: int = 5,
     bottom: int = 0,
     left: int = 0,
     right: int = 30
-    ) -> List[np.ndarray]:
+    ) -> Union[List[np.ndarray], np.ndarray]:
     """
     Add back the cropped borders to the images to restore the original image
     dimensions.
     
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to add back the cropped borders to.
     top : int, optional
         The number of pixels to add back to the top, by default 5.
@@ -65,120 +133,137 @@ def get_images_to_original_dimensions(
     
     Returns
     -------
-    list of ndarray
+    list of ndarray or ndarray
         The images with the cropped borders added back.
     """
     # Add back the cropped borders to the images.
-    return [
-        cv.copyMakeBorder(
+    return _map_images(
+        lambda img, dst=None: cv.copyMakeBorder(
             img,
             top=top,
             bottom=bottom,
             left=left,
             right=right,
             borderType=cv.BORDER_CONSTANT,
-            value=[0, 0, 0])
-        for img in images]
+            value=[0, 0, 0],
+            dst=dst),
+        images)
     
 def get_gaussian_blurred_images(
-    images: List[np.ndarray],
-    kernel_size: Tuple[int, int] = (21, 21)) -> List[np.ndarray]:
+    images: Union[List[np.ndarray], np.ndarray],
+    kernel_size: Tuple[int, int] = (21, 21)
+    ) -> Union[List[np.ndarray], np.ndarray]:
     """
     Apply a Gaussian blur to the images.
 
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to blur.
     kernel_size : (int, int), optional
         The kernel size of the Gaussian blur, by default (21, 21).
 
     Returns
     -------
-    list of ndarray
+    list of ndarray or ndarray
         The blurred images.
     """
     # Apply a Gaussian blur to the images.
-    return [cv.GaussianBlur(img, kernel_size, 0) for img in images]
+    return _map_images(
+        lambda img, dst=None: cv.GaussianBlur(img, kernel_size, 0, dst=dst),
+        images)
 
 def get_color_space_converted_images(
-    images: List[np.ndarray],
-    color_conversion_code: int = cv.COLOR_BGR2LAB) -> List[np.ndarray]:
+    images: Union[List[np.ndarray], np.ndarray],
+    color_conversion_code: int = cv.COLOR_BGR2LAB
+    ) -> Union[List[np.ndarray], np.ndarray]:
     """
     Convert the images to a different color space.
 
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to convert.
     color_conversion_code : int, optional
         The color space to convert the images to, by default cv.COLOR_BGR2GRAY.
 
     Returns
     -------
-    list of ndarray
+    list of ndarray or ndarray
         The converted images.
     """
     # Convert the images to a different color space.
-    return [cv.cvtColor(img, color_conversion_code) for img in images]
+    return _map_images(
+        lambda img, dst=None: cv.cvtColor(img, color_conversion_code, dst=dst),
+        images)
 
 def get_images_channel(
-    images: List[np.ndarray],
+    images: Union[List[np.ndarray], np.ndarray],
     channel: int
-    ) -> List[np.ndarray]:
+    ) -> Union[List[np.ndarray], np.ndarray]:
     """Get the specified channel of the images.
 
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to get the channel of.
     channel : int
         The number of the channel to get.
 
     Returns
     -------
-    list of ndarray
+    list of ndarray or ndarray
         The specified channel of the images.
     """
-    # Get the B channel of the LAB color space.
-    return [img[..., channel] for img in images]
+    # Get the B channel of the LAB color space as contiguous arrays.
+    if isinstance(images, np.ndarray):
+        return np.ascontiguousarray(images[..., channel])
+    return _map_images(
+        lambda img: np.ascontiguousarray(img[..., channel]), images)
 
-def get_otsu_threshold_masks(images: List[np.ndarray]) -> List[np.ndarray]:
+def get_otsu_threshold_masks(
+    images: Union[List[np.ndarray], np.ndarray]
+    ) -> Union[List[np.ndarray], np.ndarray]:
     """
     Apply a Otsu threshold to the images.
 
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to apply an Otsu threshold to.
 
     Returns
     -------
-    list of ndarray
+    list of ndarray or ndarray
         The threshold masks.
     """
     # Apply a Otsu threshold to the images.
-    return [cv.threshold(img, 0, 255, cv.THRESH_BINARY + cv.THRESH_OTSU)[1]
-            for img in images]
+    return _map_images(
+        lambda img, dst=None: cv.threshold(
+            img, 0, 255, cv.THRESH_BINARY + cv.THRESH_OTSU, dst=dst)[1],
+        images)
     
 def get_segmented_images(
-    images: List[np.ndarray],
-    masks: List[np.ndarray]
-    ) -> List[np.ndarray]:
+    images: Union[List[np.ndarray], np.ndarray],
+    masks: Union[List[np.ndarray], np.ndarray]
+    ) -> Union[List[np.ndarray], np.ndarray]:
     """
     Segment the images.
 
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to segment.
-    masks : list of ndarray
+    masks : list of ndarray or ndarray
         The masks to segment the images with.
 
     Returns
     -------
-    list of ndarray
+    list of ndarray or ndarray
         The segmented images.
     """
     # Segment the images.
-    return [cv.bitwise_and(img, img, mask=mask) for img, mask in zip(images, masks)]
\ No newline at end of file
+    return _map_images(
+        lambda img, mask, dst=None: cv.bitwise_and(
+            img, img, mask=mask, dst=dst),
+        images, masks)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Union
 import ipywidgets as wg
 import PIL.Image
 import cv2 as cv
@@ -7,7 +7,7 @@ import matplotlib.pyplot as plt
 
 
 def show_image_slider(
-    images: List[np.ndarray],
+    images: Union[List[np.ndarray], np.ndarray],
     title: str = 'Image slider',
     color_conversion_code: int = cv.COLOR_BGR2RGBA
     ) -> None:
@@ -16,7 +16,7 @@ def show_image_slider(
 
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to slide through.
     title : str, optional
         The title of the images to show, by default 'Image slider'.
@@ -1,31 +1,25 @@
-from typing import List
+from typing import List, Tuple, Union
 import numpy as np
 import cv2 as cv
 
-def _min_max_scale(
-    arr: np.ndarray,
-    min_value: float,
-    max_value: float
-    ) -> np.ndarray:
-    """
-    Scale the values of an array to a given range.
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
-    Parameters
-    ----------
-    arr : ndarray
-        The array to be scaled.
-    min_value : float
-        The minimum value of the range.
-    max_value : float
-        The maximum value of the range.
+try:
+    import cupy as cp
+    # Check that a CUDA device is available.
+    cp.cuda.runtime.getDeviceCount()
+except (ImportError, RuntimeError):
+    cp = None
 
-    Returns
-    -------
-    ndarray
-        The scaled vector.
-    """
-    return min_value + (arr - arr.min()) *\
-        (max_value - min_value) / (arr.max() - arr.min())
+# Width of the coordinate maps used to sample the image masks with OpenCV.
+_REMAP_WIDTH = 4096
+
+# Minimum number of voxel points for which the carving is run on the GPU,
+# below which the transfers outweigh the speedup.
+_GPU_MIN_POINTS = 1_000_000
 
 def get_voxel_grid_points(
     mesh_grid_size: int,
@@ -59,24 +53,27 @@ def get_voxel_grid_points(
     Returns
     -------
     ndarray
-        An array of points of the voxel grid in homogeneous world coordinates.
+        An array of points of the voxel grid in homogeneous world coordinates
+        of shape (4, mesh_grid_size ** 3) in single precision.
     """
-    # Get a coordinate grid of dimension
-    # (mesh_grid_size, mesh_grid_size, mesh_grid_size).
-    x, y, z = np.meshgrid(
-        np.arange(mesh_grid_size),
-        np.arange(mesh_grid_size),
-        np.arange(mesh_grid_size))
-    # Flatten the coordinate arrays.
-    x, y, z = x.flatten(), y.flatten(), z.flatten()
-    # Scale the coordinate points to the given values of the world space.
-    # The values are such that the points of the grid enclose the dinosaur.
-    x = _min_max_scale(x, x_min, x_max)
-    y = _min_max_scale(y, y_min, y_max)
-    z = _min_max_scale(z, z_min, z_max)
-    # Stack the coordinate arrays followed by a row of ones to get a matrix of
-    # homogeneous world coordinates.
-    return np.vstack((x, y, z, np.ones(x.shape))).astype(float)
+    # Get the coordinates of the voxel grid on each axis scaled to the given
+    # values of the world space. The values are such that the points of the
+    # grid enclose the dinosaur.
+    x = np.linspace(x_min, x_max, mesh_grid_size, dtype=np.float32)
+    y = np.linspace(y_min, y_max, mesh_grid_size, dtype=np.float32)
+    z = np.linspace(z_min, z_max, mesh_grid_size, dtype=np.float32)
+    # Fill a matrix of homogeneous world coordinates of dimension
+    # (4, mesh_grid_size, mesh_grid_size, mesh_grid_size) by broadcasting the
+    # axes coordinates. The points are ordered with the y coordinate varying
+    # slowest and the z coordinate varying fastest.
+    points = np.empty(
+        (4, mesh_grid_size, mesh_grid_size, mesh_grid_size), dtype=np.float32)
+    points[0] = x[None, :, None]
+    points[1] = y[:, None, None]
+    points[2] = z[None, None, :]
+    points[3] = 1.
+    # Flatten the grid dimensions.
+    return points.reshape(4, -1)
 
 def get_pixel_points(ppm: np.ndarray, points: np.ndarray) -> np.ndarray:
     """
@@ -85,24 +82,67 @@ def get_pixel_points(ppm: np.ndarray, points: np.ndarray) -> np.ndarray:
     Parameters
     ----------
     ppm : ndarray
-        The Perspective Projection Matrix.
+        The Perspective Projection Matrix, or a stack of them of shape
+        (number of views, 3, 4) to project the points on all the views.
     points : ndarray
         An array of points of the voxel grid in homogeneous world coordinates.
 
     Returns
     -------
     ndarray
-        An array of points of the voxel grid in pixel coordinates.
+        An array of points of the voxel grid in pixel coordinates of shape
+        (2, number of points), or (number of views, 2, number of points)
+        for a stack of matrices.
     """
     # Get the pixel points in homogeneous coordinates.
     points_2d = ppm @ points
-    # Divide the points by the last coordinate to get the pixel coordinates.
-    points_2d /= points_2d[-1, :]
-    # Round the pixel coordinates to the nearest integer.
-    return np.round(points_2d).astype(int)
+    # Multiply the first two coordinates by the reciprocal of the last one
+    # to get the pixel coordinates, which is cheaper than dividing them.
+    inv_w = np.reciprocal(points_2d[..., -1:, :])
+    points_2d = points_2d[..., :-1, :]
+    points_2d *= inv_w
+    # Round the pixel coordinates to the nearest integer in place and cast
+    # them to 32 bits integers, which are enough for pixel coordinates.
+    np.rint(points_2d, out=points_2d)
+    return points_2d.astype(np.int32)
+
+def _draw_voxel_points(
+    img: np.ndarray,
+    points_2d: np.ndarray,
+    color: Tuple[int, int, int, int] = (0, 0, 255, 50)
+    ) -> np.ndarray:
+    """
+    Draw the voxel points over an image in place. Each point is drawn as a
+    filled circle of radius 1, that is the pixel of the point along with
+    its 4-connected neighbours.
+
+    Parameters
+    ----------
+    img : ndarray
+        The BGRA image to draw the voxel points over.
+    points_2d : ndarray
+        An array of points of the voxel grid in pixel coordinates.
+    color : (int, int, int, int), optional
+        The BGRA color of the points, by default (0, 0, 255, 50).
+
+    Returns
+    -------
+    ndarray
+        The image with the voxel points drawn over it.
+    """
+    # Get the image width and height.
+    image_height, image_width = img.shape[:2]
+    # Draw the pixels of the circles one offset at a time for all the points.
+    for offset_x, offset_y in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)):
+        x = points_2d[0] + offset_x
+        y = points_2d[1] + offset_y
+        # Discard the pixels outside the image.
+        in_image = (x >= 0) & (x < image_width) & (y >= 0) & (y < image_height)
+        img[y[in_image], x[in_image]] = color
+    return img
 
 def get_images_with_voxel_grid(
-    images: List[np.ndarray],
+    images: Union[List[np.ndarray], np.ndarray],
     ppms: np.ndarray,
     voxel_points: np.ndarray
     ) -> List[np.ndarray]:
@@ -111,7 +151,7 @@ def get_images_with_voxel_grid(
 
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to draw the voxel grid over.
     ppms : ndarray
         The Perspective Projection Matrices.
@@ -130,17 +170,118 @@ def get_images_with_voxel_grid(
         points_2d = get_pixel_points(ppm, voxel_points)
         # Convert the image to BGRA to be able to draw transparent circles.
         img = cv.cvtColor(img, cv.COLOR_BGR2BGRA)
-        # Iterate over the pixel points by column.
-        for point in points_2d.T:
-            # Draw a circle at the pixel point on the image.
-            img = cv.circle(img, (point[0], point[1]), radius=1,
-                            color=(0, 0, 255, 50), thickness=-1)
+        # Draw a circle at each pixel point on the image.
+        img = _draw_voxel_points(img, points_2d)
         images_with_voxels.append(img)
 
     return images_with_voxels
 
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _carve_kernel(
+        ppms: np.ndarray,
+        points: np.ndarray,
+        masks: np.ndarray,
+        out: np.ndarray
+        ) -> None:
+        """
+        Fill a matrix determining for each image mask whether each voxel
+        point is inside it or not, projecting and sampling each voxel point
+        in a single pass.
+
+        Parameters
+        ----------
+        ppms : ndarray
+            The Perspective Projection Matrices of shape
+            (number of views, 3, 4).
+        points : ndarray
+            The points of the voxel grid in homogeneous world coordinates of
+            shape (4, number of voxel points).
+        masks : ndarray
+            The images masks of shape
+            (number of views, image height, image width).
+        out : ndarray
+            The matrix of shape (number of views, number of voxel points)
+            to fill.
+        """
+        n_views, image_height, image_width = masks.shape
+        for n in prange(points.shape[1]):
+            x, y, z, w = points[0, n], points[1, n], points[2, n], points[3, n]
+            for k in range(n_views):
+                # Project the voxel point on the image.
+                p_x = ppms[k, 0, 0] * x + ppms[k, 0, 1] * y + \
+                    ppms[k, 0, 2] * z + ppms[k, 0, 3] * w
+                p_y = ppms[k, 1, 0] * x + ppms[k, 1, 1] * y + \
+                    ppms[k, 1, 2] * z + ppms[k, 1, 3] * w
+                p_w = ppms[k, 2, 0] * x + ppms[k, 2, 1] * y + \
+                    ppms[k, 2, 2] * z + ppms[k, 2, 3] * w
+                # Get the pixel coordinates rounded to the nearest integer.
+                u = round(p_x / p_w)
+                v = round(p_y / p_w)
+                # Sample the image mask if the voxel point is inside the
+                # image.
+                if 0 <= u < image_width and 0 <= v < image_height:
+                    out[k, n] = masks[k, int(v), int(u)] != 0
+                else:
+                    out[k, n] = 0
+
+def _get_points_in_masks(
+    masks: np.ndarray,
+    ppms: np.ndarray,
+    voxel_points: np.ndarray
+    ) -> np.ndarray:
+    """
+    Get a matrix determining for each image mask whether each voxel point
+    is inside it or not by sampling the masks through OpenCV remapping.
+
+    Parameters
+    ----------
+    masks : ndarray
+        The images masks of shape
+        (number of views, image height, image width).
+    ppms : ndarray
+        The Perspective Projection Matrices.
+    voxel_points : ndarray
+        The points of the voxel grid in homogeneous world coordinates.
+
+    Returns
+    -------
+    ndarray
+        A matrix of 8 bits integers determining for each image mask whether
+        each voxel point is inside it (1) or not (0).
+    """
+    n_views = masks.shape[0]
+    n_points = voxel_points.shape[1]
+    # OpenCV does not remap empty maps.
+    if not n_points:
+        return np.zeros((n_views, 0), dtype=np.uint8)
+    # Lay the pixel coordinates out as maps of rows of fixed width, since
+    # OpenCV does not remap images with more than SHRT_MAX columns. The
+    # padding points are outside the images.
+    n_rows = -(-n_points // _REMAP_WIDTH)
+    map_x = np.full((n_rows, _REMAP_WIDTH), -1, dtype=np.float32)
+    map_y = np.full((n_rows, _REMAP_WIDTH), -1, dtype=np.float32)
+
+    # Allocate the resulting array of shape
+    # (number of image masks, number of voxel points) once.
+    voxel_points_in_mask = np.empty((n_views, n_points), dtype=np.uint8)
+    for k, (ppm, mask) in enumerate(zip(ppms, masks)):
+        # Get the pixel coordinates of the voxel points on the image.
+        points_2d = get_pixel_points(ppm, voxel_points)
+        map_x.ravel()[:n_points] = points_2d[0]
+        map_y.ravel()[:n_points] = points_2d[1]
+        # Sample the image mask at the pixel coordinates. The voxel points
+        # outside the image are sampled as 0 by the constant border.
+        samples = cv.remap(mask, map_x, map_y, cv.INTER_NEAREST,
+                           borderMode=cv.BORDER_CONSTANT, borderValue=0)
+        # Set the voxel points inside the image mask to 1, while the rest
+        # are set to 0, writing the row of the image mask in place.
+        np.not_equal(samples.ravel()[:n_points], 0,
+                     out=voxel_points_in_mask[k])
+    return voxel_points_in_mask
+
 def get_voxel_points_projection_is_in_images_mask(
-    images_masks: List[np.ndarray],
+    images_masks: Union[List[np.ndarray], np.ndarray],
     ppms: np.ndarray,
     voxel_points: np.ndarray
     ) -> np.ndarray:
@@ -148,9 +289,13 @@ def get_voxel_points_projection_is_in_images_mask(
     Get a matrix determining for each image mask whether each voxel point
     is inside it or not.
 
+    The computation is carried out on the GPU when CuPy is available and
+    there are more than a million voxel points, otherwise by a Numba kernel
+    when Numba is available, otherwise through NumPy and OpenCV.
+
     Parameters
     ----------
-    images_masks : list of ndarray
+    images_masks : list of ndarray or ndarray
         The images masks.
     ppms : ndarray
         The Perspective Projection Matrices.
@@ -160,38 +305,94 @@ def get_voxel_points_projection_is_in_images_mask(
     Returns
     -------
     ndarray
-        A matrix determining for each image mask whether each voxel point
-        is inside it or not.
+        A matrix of 8 bits integers determining for each image mask whether
+        each voxel point is inside it (1) or not (0).
     """
-    voxel_points_in_mask = []
-    for ppm, img in zip(ppms, images_masks):
-        # Get the image width and height.
-        image_width, image_height = img.shape[1], img.shape[0]
-        points_2d = get_pixel_points(ppm, voxel_points)
+    if cp is not None and voxel_points.shape[1] > _GPU_MIN_POINTS:
+        return get_voxel_points_projection_is_in_images_mask_gpu(
+            images_masks, ppms, voxel_points)
+
+    # Pair each Perspective Projection Matrix with its image mask.
+    n_views = min(len(ppms), len(images_masks))
+    # Stack the image masks to get a contiguous array of shape
+    # (number of views, image height, image width). This is free if the
+    # masks are already stored in such an array.
+    masks = np.ascontiguousarray(images_masks[:n_views], dtype=np.uint8)
+
+    if njit is None:
+        return _get_points_in_masks(masks, ppms, voxel_points)
+
+    # Stack the Perspective Projection Matrices to get a contiguous array of
+    # shape (number of views, 3, 4).
+    ppms = np.ascontiguousarray(np.stack(ppms[:n_views]), dtype=np.float32)
+    voxel_points = np.ascontiguousarray(voxel_points, dtype=np.float32)
+    voxel_points_in_mask = np.empty(
+        (n_views, voxel_points.shape[1]), dtype=np.uint8)
+    _carve_kernel(ppms, voxel_points, masks, voxel_points_in_mask)
+    return voxel_points_in_mask
+
+def get_voxel_points_projection_is_in_images_mask_gpu(
+    images_masks: Union[List[np.ndarray], np.ndarray],
+    ppms: np.ndarray,
+    voxel_points: np.ndarray
+    ) -> np.ndarray:
+    """
+    Get a matrix determining for each image mask whether each voxel point
+    is inside it or not, computing it on the GPU through CuPy.
+
+    Parameters
+    ----------
+    images_masks : list of ndarray or ndarray
+        The images masks.
+    ppms : ndarray
+        The Perspective Projection Matrices.
+    voxel_points : ndarray
+        The points of the voxel grid in homogeneous world coordinates.
+
+    Returns
+    -------
+    ndarray
+        A matrix of 8 bits integers determining for each image mask whether
+        each voxel point is inside it (1) or not (0).
+
+    Raises
+    ------
+    ImportError
+        If CuPy or a CUDA device is not available.
+    """
+    if cp is None:
+        raise ImportError('CuPy and a CUDA device are required to run the '
+                          'voxel carving on the GPU.')
+    # Pair each Perspective Projection Matrix with its image mask.
+    n_views = min(len(ppms), len(images_masks))
+    # Transfer the image masks, the Perspective Projection Matrices and the
+    # voxel points to the GPU once.
+    masks = cp.asarray(
+        np.ascontiguousarray(images_masks[:n_views], dtype=np.uint8))
+    ppms = cp.asarray(np.stack(ppms[:n_views]), dtype=cp.float32)
+    voxel_points = cp.asarray(voxel_points, dtype=cp.float32)
+    image_height, image_width = masks.shape[1:]
+
+    voxel_points_in_mask = cp.empty(
+        (n_views, voxel_points.shape[1]), dtype=cp.uint8)
+    # Process one view at a time to bound the GPU memory usage.
+    for k in range(n_views):
+        # Project the voxel points on the image and get the pixel
+        # coordinates rounded to the nearest integer.
+        points_2d = ppms[k] @ voxel_points
+        points_2d[:-1] *= cp.reciprocal(points_2d[-1])
+        u, v = cp.rint(points_2d[:-1]).astype(cp.int32)
         # Get an array tracking whether each voxel point is inside the image
         # or not.
-        x_in_image = np.logical_and(
-            points_2d[0, :] >= 0, points_2d[0, :] < image_width)
-        y_in_image = np.logical_and(
-            points_2d[1, :] >= 0, points_2d[1, :] < image_height)
-        points_in_image = np.logical_and(x_in_image, y_in_image)
-        # Get the indices of the voxel points inside the image.
-        indices_in_image = np.where(points_in_image)[0]
-        # Get an array tracking whether each voxel point is inside the image
-        # mask or not.
-        points_in_mask = np.zeros(points_2d.shape[1])
-        # Get the pixel coordinates of the voxel points inside the image.
-        points_in_image_coords = points_2d[:-1, indices_in_image]
-        # Set the voxel points inside the image mask to 1, while the rest
-        # are set to 0.
-        res = img[points_in_image_coords[1, :], points_in_image_coords[0, :]]
-        res = res.astype(bool)
-        points_in_mask[indices_in_image] = res 
-
-        voxel_points_in_mask.append(points_in_mask)
-    # Stack the result to get an array of shape
-    # (number of image masks, number of voxel points).
-    return np.vstack(voxel_points_in_mask)
+        points_in_image = (u >= 0) & (u < image_width) & \
+            (v >= 0) & (v < image_height)
+        # Sample the image mask at the clipped pixel coordinates and discard
+        # the samples of the voxel points outside the image.
+        samples = masks[k, cp.clip(v, 0, image_height - 1),
+                        cp.clip(u, 0, image_width - 1)]
+        voxel_points_in_mask[k] = (samples != 0) & points_in_image
+    # Transfer the result back to the host.
+    return cp.asnumpy(voxel_points_in_mask)
 
 def get_voxel_points_occupancy(
     voxel_points_in_masks: np.ndarray
@@ -209,7 +410,9 @@ def get_voxel_points_occupancy(
     ndarray
         The number of image masks each voxel point is inside.
     """
-    return np.sum(voxel_points_in_masks, axis=0)
+    # The number of image masks fits in 16 bits, so sum the 8 bits matrix
+    # directly in 16 bits instead of promoting it to 64 bits.
+    return voxel_points_in_masks.sum(axis=0, dtype=np.uint16)
 
 def get_voxel_points_by_minimum_occupancy(
     voxel_points: np.ndarray,
@@ -235,7 +438,7 @@ def get_voxel_points_by_minimum_occupancy(
     return voxel_points[:, occupancy >= min_occupancy]
 
 def get_images_with_voxel_carving(
-    images: List[np.ndarray],
+    images: Union[List[np.ndarray], np.ndarray],
     ppms: np.ndarray,
     voxel_points: np.ndarray
     ) -> List[np.ndarray]:
@@ -244,7 +447,7 @@ def get_images_with_voxel_carving(
 
     Parameters
     ----------
-    images : list of ndarray
+    images : list of ndarray or ndarray
         The images to draw the voxel carving over.
     ppms : ndarray
         The Perspective Projection Matrices.
@@ -263,11 +466,8 @@ def get_images_with_voxel_carving(
         points_2d = get_pixel_points(ppm, voxel_points)
         # Convert the image to BGRA to be able to draw transparent circles.
         img = cv.cvtColor(img, cv.COLOR_GRAY2BGRA)
-        # Iterate over the pixel points by column.
-        for point in points_2d.T:
-            # Draw a circle at the pixel point on the image.
-            img = cv.circle(img, (point[0], point[1]), radius=1,
-                            color=(0, 0, 255, 50), thickness=-1)
+        # Draw a circle at each pixel point on the image.
+        img = _draw_voxel_points(img, points_2d)
         images_with_voxels.append(img)
 
     return images_with_voxels
@@ -0,0 +1,55 @@
+import os
+import numpy as np
+import pytest
+from src.data_loader import get_perspective_projection_matrices
+from src.voxeling import (_get_points_in_masks,
+                          get_voxel_grid_points,
+                          get_voxel_points_projection_is_in_images_mask)
+
+INPUT_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'input')
+
+@pytest.fixture
+def ppms() -> np.ndarray:
+    return get_perspective_projection_matrices(INPUT_DIR)
+
+@pytest.fixture
+def masks(ppms: np.ndarray) -> np.ndarray:
+    # Random binary masks with the dimensions of the dinosaur images.
+    rng = np.random.default_rng(42)
+    return (rng.random((len(ppms), 576, 720)) > .5).astype(np.uint8) * 255
+
+@pytest.fixture
+def voxel_points() -> np.ndarray:
+    return get_voxel_grid_points(30, -0.05, 0.05, -0.1, 0.04, -0.75, -0.5)
+
+def test_fallback_matches_carve_kernel(
+    masks: np.ndarray,
+    ppms: np.ndarray,
+    voxel_points: np.ndarray
+    ) -> None:
+    pytest.importorskip('numba')
+    from src.voxeling import _carve_kernel
+
+    expected = np.empty((len(ppms), voxel_points.shape[1]), dtype=np.uint8)
+    _carve_kernel(ppms, voxel_points, masks, expected)
+
+    result = _get_points_in_masks(masks, ppms, voxel_points)
+    assert result.dtype == np.uint8
+    np.testing.assert_array_equal(result, expected)
+
+def test_fallback_without_voxel_points(
+    masks: np.ndarray,
+    ppms: np.ndarray
+    ) -> None:
+    result = _get_points_in_masks(
+        masks, ppms, np.empty((4, 0), dtype=np.float32))
+    assert result.shape == (len(ppms), 0)
+    assert result.dtype == np.uint8
+
+def test_projection_without_voxel_points(
+    masks: np.ndarray,
+    ppms: np.ndarray
+    ) -> None:
+    result = get_voxel_points_projection_is_in_images_mask(
+        masks, ppms, np.empty((4, 0), dtype=np.float32))
+    assert result.shape == (len(ppms), 0)